@@ -1,5 +1,4 @@
 __all__ = ['Pollable', 'PollableEvent']
-# TODO look into eventfd
 class BasePollable(object):
     """A pollable object.
 
@@ -61,12 +60,40 @@ if platform.system() == 'Windows':
 
 else:
     import os
-    class Pollable(BasePollable):
-        def __init__(self):
-            r, w = os.pipe()
-            r = os.fdopen(r, 'rb')
-            w = os.fdopen(w, 'wb')
-            super(Pollable, self).__init__(r, w)
+    if hasattr(os, 'eventfd'):
+        class Pollable(BasePollable):
+            """Use a single eventfd instead of a pipe pair."""
+            fd = None
+            def __init__(self):
+                super(Pollable, self).__init__(None, None)
+                self.fd = os.eventfd(0, os.EFD_CLOEXEC)
+
+            def fileno(self):
+                return self.fd
+
+            def close(self):
+                if self.fd is not None:
+                    os.close(self.fd)
+                    self.fd = None
+
+            def set(self):
+                """Increment the eventfd counter."""
+                if not self.on:
+                    self.on = True
+                    os.eventfd_write(self.fd, 1)
+
+            def clear(self):
+                """Reset the counter, may hang if never set."""
+                if self.on:
+                    os.eventfd_read(self.fd)
+                    self.on = False
+    else:
+        class Pollable(BasePollable):
+            def __init__(self):
+                r, w = os.pipe()
+                r = os.fdopen(r, 'rb', 0)
+                w = os.fdopen(w, 'wb', 0)
+                super(Pollable, self).__init__(r, w)
 
 
 class PollableEvent(Pollable):
@@ -85,9 +112,13 @@ class PollableEvent(Pollable):
             super(PollableEvent, self).close()
 
     def set(self):
-        with self.lock:
-            super(PollableEvent, self).set()
+        """Threadsafe. Skip the lock if already set."""
+        if not self.on:
+            with self.lock:
+                super(PollableEvent, self).set()
 
     def clear(self):
-        with self.lock:
-            super(PollableEvent, self).clear()
+        """Threadsafe. Skip the lock if already cleared."""
+        if self.on:
+            with self.lock:
+                super(PollableEvent, self).clear()
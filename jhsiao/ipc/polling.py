@@ -6,6 +6,7 @@ linux may have epoll etc, which generally have better performance.
 """
 from __future__ import print_function
 __all__ = ['Poller']
+import errno
 import select
 import sys
 from itertools import chain
@@ -23,10 +24,15 @@ class BasePoller(object):
     """Base poller class.  Set the interface.
 
     Registered items should have a fileno() or be a fileno.
+    Subclasses should keep registered items in an items dict of
+    {fd: item}.
     """
     def __iter__(self):
-        """Iterate on items that have been registered."""
-        raise NotImplementedError
+        """Iterate on items that have been registered.
+
+        This is a snapshot so unregistering while iterating is ok.
+        """
+        return iter(list(self.items.values()))
 
     def unregister(self, item):
         """Unregister an item by value or fd."""
@@ -37,7 +43,10 @@ class BasePoller(object):
         item will be what is returned if polled.
         mode can be an int (varies by class based on the underlying
         implementation) or can be a str of flags 'rwxo' for general
-        read/write/error/oneshot.
+        read/write/error/oneshot.  Pollers that support it (epoll) also
+        accept 'e' for edge-triggered.  Edge-triggered items stay
+        registered but are only returned again after a new event, so
+        they should be read/written until they would block.
         """
         raise NotImplementedError
     def modify(self, item, mode):
@@ -52,7 +61,10 @@ class BasePoller(object):
                 poller.modify(f.fileno(), mode)
                 # now polling will return the fileno
         """
-        raise NotImplementedError
+        if getfd(item) not in self.items:
+            raise ValueError(
+                'Tried to modify {} which was never registered'.format(item))
+        self.register(item, mode)
 
     def close(self):
         raise NotImplementedError
@@ -67,6 +79,15 @@ class BasePoller(object):
         """
         raise NotImplementedError
 
+    def _get_flags(self, mode):
+        """Translate str flags into int flags."""
+        if isinstance(mode, int):
+            return mode
+        flags = 0
+        for m in mode:
+            flags |= getattr(self, m.upper()+'FLAGS', 0)
+        return flags
+
 class _TruePoller(BasePoller):
     """Wrap an actual polling object.
 
@@ -78,13 +99,12 @@ class _TruePoller(BasePoller):
     def __init__(self):
         self.e = self.cls()
         self.items = {}
-
-    def __iter__(self):
-        return iter(self.items.values())
+        self.flags = {}
 
     def unregister(self, item):
         fd = getfd(item)
         self.items.pop(fd)
+        self.flags.pop(fd, None)
         try:
             self.e.unregister(fd)
         except Exception:
@@ -92,44 +112,54 @@ class _TruePoller(BasePoller):
 
     def register(self, item, mode):
         fd = getfd(item)
+        flags = self._get_flags(mode)
         if fd in self.items:
-            self.unregister(fd)
-        self.e.register(fd, self._get_flags(mode))
+            # Always tell the kernel: epoll drops closed fds on its own,
+            # so even the same item and flags may be a reused fd.
+            self._modify_or_register(fd, flags)
+        else:
+            self.e.register(fd, flags)
         self.items[fd] = item
+        self.flags[fd] = flags
 
-    def modify(self, item, mode):
-        fd = getfd(item)
-        if fd not in self.items:
-            raise ValueError(
-                'Tried to modify {} which was never registered'.format(item))
-        self.e.modify(fd, self._get_flags(mode))
-        self.items[fd] = item
+    def _modify_or_register(self, fd, flags):
+        """Modify fd, register instead if the kernel dropped it.
+
+        A closed fd is removed from epoll without unregister() and the
+        number can be reused by a new file.
+        """
+        try:
+            self.e.modify(fd, flags)
+        except EnvironmentError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            self.e.register(fd, flags)
 
     def poll(self, timeout=-1, events=False):
         if timeout is None:
             timeout = -1
         r, w, x = [], [], []
-        for fd, ev in self.e.poll(timeout):
-            item = (self.items[fd], ev) if events else self.items[fd]
-            if ev & self.RFLAGS:
+        items = self.items
+        RFLAGS = self.RFLAGS
+        WFLAGS = self.WFLAGS
+        XFLAGS = self.XFLAGS
+        for fd, ev in self._rawpoll(timeout):
+            item = (items[fd], ev) if events else items[fd]
+            if ev & RFLAGS:
                 r.append(item)
-            if ev & self.WFLAGS:
+            if ev & WFLAGS:
                 w.append(item)
-            if ev & self.XFLAGS:
+            if ev & XFLAGS:
                 x.append(item)
         return r, w, x
     def close(self):
         self.e.close()
         self.items.clear()
+        self.flags.clear()
 
-    def _get_flags(self, mode):
-        """Translate str flags into int flags."""
-        if isinstance(mode, int):
-            return mode
-        flags = 0
-        for m in mode:
-            flags |= getattr(self, m.upper()+'FLAGS', 0)
-        return flags
+    def _rawpoll(self, timeout):
+        """Return the (fd, event) pairs from the wrapped poller."""
+        return self.e.poll(timeout)
 
 class OneshotWrapper(object):
     """Add one-shot-like behavior to raw poller."""
@@ -143,21 +173,20 @@ class OneshotWrapper(object):
         self._register = orig.register
         self._modify = orig.modify
         self._poll = orig.poll
-        self._close = orig.close
+        # select.poll has no close()
+        self._close = getattr(orig, 'close', None)
 
     def unregister(self, fd):
         self.oneshot.discard(fd)
         self._unregister(fd)
     def register(self, fd, flags):
-        nflags = flags & self.RFLAG
-        self._register(fd, nflags)
-        if nflags != flags:
-            self.oneshot.add(fd)
-        else:
-            self.oneshot.discard(fd)
+        self._set(self._register, fd, flags)
     def modify(self, fd, flags):
+        self._set(self._modify, fd, flags)
+    def _set(self, func, fd, flags):
+        """Call func without the oneshot flag and track oneshot fds."""
         nflags = flags & self.RFLAG
-        self._register(fd, nflags)
+        func(fd, nflags)
         if nflags != flags:
             self.oneshot.add(fd)
         else:
@@ -170,10 +199,11 @@ class OneshotWrapper(object):
         return ret
     def close(self):
         self.oneshot.clear()
-        self._close()
+        if self._close is not None:
+            self._close()
 
 if hasattr(select, 'select'):
-    class SelectPoller(object):
+    class SelectPoller(BasePoller):
         """Wrap the select interface in poll-like interface."""
         backend = 'select'
         select = select.select
@@ -181,63 +211,31 @@ if hasattr(select, 'select'):
         WFLAGS = 2
         XFLAGS = 4
         OFLAGS = 8
-        NFLAGS = ((1, 'r'), (2, 'w'), (4, 'x'), (8, 'o'))
         def __init__(self):
+            self.items = {}
             self.r = {}
             self.w = {}
             self.x = {}
             self.o = {}
-
-        def __iter__(self):
-            ret = dict(self.r)
-            ret.update(self.w)
-            ret.update(self.x)
-            ret.update(self.o)
-            return iter(ret.values())
+            self._dicts = (
+                (self.RFLAGS, self.r), (self.WFLAGS, self.w),
+                (self.XFLAGS, self.x), (self.OFLAGS, self.o))
 
         def unregister(self, item):
             fd = getfd(item)
-            for d in (self.r, self.w, self.x, self.o):
+            self.items.pop(fd, None)
+            for flag, d in self._dicts:
                 d.pop(fd, None)
 
-        def _popornot(self, add, f, fd, item):
-            if add:
-                getattr(self, f)[fd] = item
-            else:
-                getattr(self, f).pop(fd, None)
-
         def register(self, item, flags):
             fd = getfd(item)
-            if isinstance(flags, int):
-                for v, f in self.NFLAGS:
-                    self._popornot(flags & v, f, fd, item)
-            else:
-                for f in 'rwxo':
-                    self._popornot(f in flags, f, fd, item)
-
-        def _gpopornot(self, add, f, fd, item):
-            if add:
-                d = getattr(self, f)
-                orig = d.get(fd, None)
-                d[fd] = item
-                return orig
-            else:
-                return getattr(self, f).pop(fd, None)
-
-        def modify(self, item, flags):
-            fd = getfd(item)
-            orig = None
-            if isinstance(flags, int):
-                for v, f in self.NFLAGS:
-                    orig = self._gpopornot(v&flags, f, fd, item) or orig
-            else:
-                for f in 'rwxo':
-                    orig = self._gpopornot(f in flags, f, fd, item) or orig
-            if orig is None:
-                self.unregister(item)
-                raise ValueError(
-                    ('Tried to modify {} which '
-                    'was never registered').format(item))
+            flags = self._get_flags(flags)
+            for flag, d in self._dicts:
+                if flags & flag:
+                    d[fd] = item
+                else:
+                    d.pop(fd, None)
+            self.items[fd] = item
 
         def poll(self, timeout=None, events=False):
             """Note that if no active fds, then instant return with empty lists."""
@@ -246,32 +244,33 @@ if hasattr(select, 'select'):
             r = self.r
             w = self.w
             x = self.x
-            try:
-                lsts = self.select(r, w, x, timeout)
-            except Exception:
-                if not any((r,w,x)):
-                    return ((),(),())
-                else:
-                    raise
+            if not (r or w or x):
+                # select() errors on Windows and sleeps elsewhere.
+                return [], [], []
+            lsts = self.select(r, w, x, timeout)
             if events:
                 ret = [
                     [(dct[fd], ev) for fd in lst]
-                    for dct, lst, ev in zip(dct, lsts, (1,2,4))]
+                    for dct, lst, ev in zip(
+                        (r,w,x), lsts,
+                        (self.RFLAGS, self.WFLAGS, self.XFLAGS))]
             else:
                 ret = [
-                    [dct[fd] for fd in lst]
+                    list(map(dct.__getitem__, lst))
                     for dct, lst in zip((r,w,x), lsts)]
             o = self.o
             if o:
-                s = set(o)
-                for dct, lst in zip((r,w,x), lsts):
-                    for k in s.intersection(lst):
-                        dct.pop(k, None)
+                # Like EPOLLONESHOT, any event disarms the whole fd.
+                for fd in set(chain(*lsts)).intersection(o):
+                    r.pop(fd, None)
+                    w.pop(fd, None)
+                    x.pop(fd, None)
             return ret
 
         def close(self):
-            for f in 'rwxo':
-                getattr(self, f).clear()
+            self.items.clear()
+            for flag, d in self._dicts:
+                d.clear()
     Poller = SelectPoller
 
 if hasattr(select, 'poll') or hasattr(select, 'devpoll'):
@@ -300,8 +299,12 @@ if hasattr(select, 'poll') or hasattr(select, 'devpoll'):
                 shift += 1
         OFLAGS = OFLAGS()
         def __init__(self):
-            super(PollPoller, self).__init__()
+            super(PPoller, self).__init__()
             self.e = OneshotWrapper(self.e, self.OFLAGS)
+
+        def _rawpoll(self, timeout):
+            # poll/devpoll timeouts are in milliseconds
+            return self.e.poll(timeout * 1000 if timeout > 0 else timeout)
     if hasattr(select, 'devpoll'):
         class DevpollPoller(PPoller):
             cls = select.devpoll
@@ -318,7 +321,6 @@ if hasattr(select, 'epoll'):
         """Wrap the epoll interface."""
         cls = select.epoll
         backend = 'epoll'
-        cls = select.epoll
         IN = select.EPOLLIN
         PRI = select.EPOLLPRI
         RDNORM = select.EPOLLRDNORM
@@ -327,10 +329,16 @@ if hasattr(select, 'epoll'):
         WRNORM = select.EPOLLWRNORM
         WRBAND = select.EPOLLWRBAND
         ERR = select.EPOLLERR
-        RFLAGS = IN|PRI|RDNORM|RDBAND
+        RDHUP = getattr(select, 'EPOLLRDHUP', 0)
+        RFLAGS = IN|PRI|RDNORM|RDBAND|RDHUP
         WFLAGS = OUT|WRNORM|WRBAND
         XFLAGS = ERR
         OFLAGS = select.EPOLLONESHOT
+        EFLAGS = select.EPOLLET
+
+        def _rawpoll(self, timeout):
+            # default maxevents allocates FD_SETSIZE-1 events per call
+            return self.e.poll(timeout, max(len(self.items), 1))
     Poller = EpollPoller
 
 try:
@@ -39,6 +39,7 @@ else:
         errno,
         'EWOULDBLOCK',
         10035 if platform.system() == 'Windows' else 11)
+WOULDBLOCK = frozenset((EAGAIN, EWOULDBLOCK))
 
 #------------------------------
 # cloexec close socket in child processes
@@ -333,14 +334,16 @@ class Sockfile(io.RawIOBase):
     @staticmethod
     def _block_to_none(func):
         """Convert socket timeout and EAGAIN, EWOULDBLOCK to None."""
+        wouldblock = WOULDBLOCK
+        timeout = socket.timeout
         @functools.wraps(func)
         def wrap(arg):
             try:
                 return func(arg)
-            except socket.timeout:
+            except timeout:
                 return None
             except EnvironmentError as e:
-                if e.errno in (EAGAIN, EWOULDBLOCK):
+                if e.errno in wouldblock:
                     return None
                 raise
         return wrap
@@ -1,73 +1,75 @@
 from __future__ import print_function
-from jhsiao.ipc.polling import Poller
+from jhsiao.ipc import polling
 import socket
 import sys
 import time
 
-def test_oneshot():
+monotonic = getattr(time, 'monotonic', time.time)
+# shared by every poller_polling run
+_DATA = b'hello world'*(1<<16)
+_SCRATCH = memoryview(bytearray(1<<16))
+
+def timed(func, *args):
+    """Return func(*args) and how many seconds it took."""
+    now = monotonic()
+    ret = func(*args)
+    return ret, monotonic() - now
+
+def oneshot_polling(Poller):
     l = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    l.bind(('localhost', 0))
+    l.bind(('127.0.0.1', 0))
     l.listen(1)
     L = 0.1
     S = L/2
 
     p = Poller()
-    p.register(l, p.RFLAGS)
+    R, O = p.RFLAGS, p.OFLAGS
+    poll = p.poll
+    p.register(l, R)
     # no data should block
-    now = time.time()
-    assert not any(p.poll(L))
-    assert time.time()-now > S
+    res, t = timed(poll, L)
+    assert not any(res) and t > S
     c = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    c.connect(('localhost', l.getsockname()[1]))
+    c.connect(('127.0.0.1', l.getsockname()[1]))
     #has data should return immediately
-    now = time.time()
-    assert p.poll(L)[0]
-    assert time.time()-now < S
+    res, t = timed(poll, L)
+    assert res[0] and t < S
     #level triggered no oneshot should return immediately again
-    now = time.time()
-    assert p.poll(L)[0]
-    assert time.time()-now < S
+    res, t = timed(poll, L)
+    assert res[0] and t < S
     s, a = l.accept()
     s.close()
     c.close()
 
     # testing oneshot
-    p.modify(l, p.RFLAGS|p.OFLAGS)
+    p.modify(l, R|O)
     # no data, should block
-    now = time.time()
-    assert not any(p.poll(L))
-    assert time.time()-now > S
+    res, t = timed(poll, L)
+    assert not any(res) and t > S
     # oneshot but no event means should block again
-    now = time.time()
-    assert not any(p.poll(L))
-    assert time.time()-now > S
+    res, t = timed(poll, L)
+    assert not any(res) and t > S
     c = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    c.connect(('localhost', l.getsockname()[1]))
+    c.connect(('127.0.0.1', l.getsockname()[1]))
     #make sure active flags set not empty
-    p.register(c, p.RFLAGS)
+    p.register(c, R)
     #has data should return immediately once
-    now = time.time()
-    assert p.poll(L)[0]
-    assert time.time()-now < S
-    now = time.time()
-    assert not any(p.poll(L))
-    assert time.time()-now > S
+    res, t = timed(poll, L)
+    assert res[0] and t < S
+    res, t = timed(poll, L)
+    assert not any(res) and t > S
     # modify to rearm the fd
-    p.modify(l, p.RFLAGS|p.OFLAGS)
-    now = time.time()
-    assert p.poll(L)[0]
-    assert time.time()-now < S
-    now = time.time()
-    assert not any(p.poll(L))
-    assert time.time()-now > S
+    p.modify(l, R|O)
+    res, t = timed(poll, L)
+    assert res[0] and t < S
+    res, t = timed(poll, L)
+    assert not any(res) and t > S
     # modify to remove oneshot
-    p.modify(l, p.RFLAGS)
-    now = time.time()
-    assert p.poll(L)[0]
-    assert time.time()-now < S
-    now = time.time()
-    assert p.poll(L)[0]
-    assert time.time()-now < S
+    p.modify(l, R)
+    res, t = timed(poll, L)
+    assert res[0] and t < S
+    res, t = timed(poll, L)
+    assert res[0] and t < S
     s, a = l.accept()
     p.unregister(c)
     p.unregister(l)
@@ -78,53 +80,53 @@ def test_oneshot():
     print('pass')
 
 
-def test_poller():
+def poller_polling(Poller):
     p = Poller()
+    poll = p.poll
     import socket
     l = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    l.bind(('', 0))
+    l.bind(('127.0.0.1', 0))
     l.listen(1)
     c = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    c.connect(('localhost', l.getsockname()[1]))
+    c.connect(('127.0.0.1', l.getsockname()[1]))
     s, a = l.accept()
     l.close()
     try:
         p.register(c, 'rw')
-        r,w,x = p.poll(1)
+        r,w,x = poll(1)
         assert not r and w and not x
         s.send(b'hello')
-        r,w,x = p.poll(1)
+        r,w,x = poll(1)
         assert r and w and not x
         c.recv(5)
-        r,w,x = p.poll(1)
+        r,w,x = poll(1)
         assert not r and w and not x
         c.settimeout(1)
         written = 0
         print('filling socket buffer...', end='')
         sys.stdout.flush()
         try:
-            data = b'hello world'*1024
+            # large chunks, fill in few calls, send() returns partial
+            send = c.send
             while 1:
-                wrote = c.send(data)
-                if wrote != len(data):
-                    print('wrote less data')
-                written += wrote
+                written += send(_DATA)
         except socket.timeout:
             print('done')
             print('filled at', written)
-        assert not any(p.poll(1))
-        buf = memoryview(bytearray(8192))
+        assert not any(poll(1))
+        buf = _SCRATCH
         s.settimeout(1)
         print('emptying socket buffer...')
+        recv_into = s.recv_into
         try:
-            received = s.recv_into(buf)
-            res = p.poll(1)
+            received = recv_into(buf)
+            res = poll(1)
             while not res[1]:
-                received += s.recv_into(buf)
-                res = p.poll(0)
+                received += recv_into(buf)
+                res = poll(0)
             print('unblocked at', received, list(map(len, res)))
             while 1:
-                received += s.recv_into(buf)
+                received += recv_into(buf)
         except socket.timeout:
             print('done')
             print('received total of', received)
@@ -136,6 +138,97 @@ def test_poller():
 
     print('pass')
 
+def test_select_events():
+    a, b = socket.socketpair()
+    p = polling.SelectPoller()
+    try:
+        p.register(a, 'rw')
+        r, w, x = p.poll(1, True)
+        assert not r and w == [(a, p.WFLAGS)] and not x
+        b.send(b'hello')
+        r, w, x = p.poll(1, True)
+        assert r == [(a, p.RFLAGS)] and w == [(a, p.WFLAGS)] and not x
+    finally:
+        p.close()
+        a.close()
+        b.close()
+    print('pass')
+
+def reuse_polling(Poller, first, second, byfd=False):
+    """Register a new socket whose fd was closed without unregister.
+
+    byfd: register the int fd instead of the socket object.
+    """
+    p = Poller()
+    a, b = socket.socketpair()
+    try:
+        fd = a.fileno()
+        p.register(fd if byfd else a, first)
+        a.close()
+        b.close()
+        a, b = socket.socketpair()
+        assert fd in (a.fileno(), b.fileno())
+        if b.fileno() == fd:
+            a, b = b, a
+        item = fd if byfd else a
+        p.register(item, second)
+        b.send(b'hello')
+        assert p.poll(1)[0] == [item]
+    finally:
+        p.close()
+        a.close()
+        b.close()
+    print('pass')
+
+# Prefer the scalable backends, select is the fallback (Windows).
+if hasattr(polling, 'EpollPoller'):
+    def test_epoll_oneshot():
+        oneshot_polling(polling.EpollPoller)
+    def test_epoll_poller():
+        poller_polling(polling.EpollPoller)
+    def test_epoll_reuse():
+        reuse_polling(polling.EpollPoller, 'w', 'r')
+    def test_epoll_reuse_same_flags():
+        reuse_polling(polling.EpollPoller, 'r', 'r')
+    def test_epoll_reuse_fd():
+        reuse_polling(polling.EpollPoller, 'r', 'r', True)
+    def test_epoll_edge():
+        a, b = socket.socketpair()
+        p = polling.EpollPoller()
+        try:
+            p.register(a, 're')
+            assert not any(p.poll(0))
+            b.send(b'hello')
+            assert p.poll(1)[0] == [a]
+            # no new data, no new edge
+            assert not any(p.poll(0))
+            b.send(b'world')
+            assert p.poll(1)[0] == [a]
+            assert a.recv(10) == b'helloworld'
+            b.close()
+            # peer closed
+            assert p.poll(1)[0] == [a]
+        finally:
+            p.close()
+            a.close()
+            b.close()
+        print('pass')
+if hasattr(polling, 'DevpollPoller'):
+    def test_devpoll_oneshot():
+        oneshot_polling(polling.DevpollPoller)
+    def test_devpoll_poller():
+        poller_polling(polling.DevpollPoller)
+if hasattr(polling, 'PollPoller'):
+    def test_poll_oneshot():
+        oneshot_polling(polling.PollPoller)
+    def test_poll_poller():
+        poller_polling(polling.PollPoller)
+if hasattr(polling, 'SelectPoller'):
+    def test_select_oneshot():
+        oneshot_polling(polling.SelectPoller)
+    def test_select_poller():
+        poller_polling(polling.SelectPoller)
+
 if __name__ == '__main__':
     from jhsiao.tests import simple
     simple(globals())
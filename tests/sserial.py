@@ -18,7 +18,7 @@ pload = pickle.load
 with Scope('s') as s:
     def pkldump(thing, pf, sf, af, sdump):
         pf.seek(0)
-        return pickle.dump(thing, pf)
+        return pickle.dump(thing, pf, pickle.HIGHEST_PROTOCOL)
     def ssdump(thing, pf, sf, af, sdump):
         sf.seek(0)
         return sdump(thing, sf)
@@ -82,14 +82,15 @@ def main():
                 (ss.Int64, (-(1<<63), (1<<63)-1), (-(1<<63)-1, 1<<63))
             ):
             print('\ttesting', tp.__name__, end=': ')
+            dump, load, seek = tp.dump, tp.load, f.seek
             for x in testvals:
-                f.seek(0)
-                tp.dump(x, f)
-                f.seek(0)
-                assert tp.load(f) == x
+                seek(0)
+                dump(x, f)
+                seek(0)
+                assert load(f) == x
             for x in failvals:
                 try:
-                    tp.dump(x, f)
+                    dump(x, f)
                 except Exception:
                     pass
                 else: